@@ -7,11 +7,112 @@ Dayan Divination Simulator
 生成本卦和之卦，用于周易占卜。
 """
 
+import io
 import random
 import time
 import sys
 
 
+# 打字机效果的刷新间隔（字符数）
+_TYPE_FLUSH_EVERY = 4
+
+# 分二时人手误差的标准差（策数）
+_SPLIT_SIGMA = 2.0
+
+# 爻位名称（自初爻起）
+_POS_NAMES = ("初", "二", "三", "四", "五", "上")
+
+# 爻值 -> 演算结果描述
+_LINE_RESULT = {
+    6: "老阴 (六) -> 变",
+    7: "少阳 (七) -> 不变",
+    8: "少阴 (八) -> 不变",
+    9: "老阳 (九) -> 变",
+}
+
+# 爻值 -> (本卦图形, 爻名)；老阴、老阳分别以 x、o 标记变爻
+_LINE_GLYPH = {
+    6: ("— — x", "老阴"),
+    7: ("———  ", "少阳"),
+    8: ("— —  ", "少阴"),
+    9: ("——— o", "老阳"),
+}
+
+
+def _human_split(normal, total):
+    """
+    【分二】人手分草，符合高斯分布（正态分布）
+
+    Args:
+        normal: 正态分布采样函数，如 random.Random().normalvariate
+        total: 待分的蓍草数
+
+    Returns:
+        tuple: (left, right) 左右两堆的策数
+    """
+    # 模拟人手误差，大部分时候在中间，偶尔偏多偏少
+    left = int(normal(total / 2, _SPLIT_SIGMA))
+
+    # 边界修正：任何一堆至少要有1根
+    if left < 1: left = 1
+    if left >= total: left = total - 1
+
+    return left, total - left
+
+
+def _remainder(count):
+    """【揲四】四根一数，余数落在 1~4，整除时取 4"""
+    remainder = count % 4
+    if remainder == 0:
+        remainder = 4
+    return remainder
+
+
+def _simulate_kernel(rng, build_log=True):
+    """
+    大衍筮法的纯数值核心：六爻 × 三变
+
+    Args:
+        rng: random.Random 实例，用于分二的高斯采样
+        build_log: 是否记录每一变的数据，默认True
+
+    Returns:
+        tuple: (final_lines, records)
+            final_lines: 六个爻值 (6/7/8/9)，自初爻起
+            records: 每爻三变的记录，每条为
+                (left, right, left_rem, right_rem, removed, new_total)；
+                build_log 为 False 时为 None
+    """
+    # 用 normalvariate 而非 gauss：gauss 缓存了配对的样本，多线程共用同一实例时不安全
+    normal = rng.normalvariate
+    final_lines = []
+    records = [] if build_log else None
+
+    for _ in range(6):
+        current = 49
+        line_records = []
+        for _ in range(3):
+            # 分二
+            left, right = _human_split(normal, current)
+
+            # 挂一：右手取一策；揲四：左右两堆分别四根一数
+            left_rem = _remainder(left)
+            right_rem = _remainder(right - 1)
+
+            # 归奇
+            removed = 1 + left_rem + right_rem
+            current -= removed
+            if build_log:
+                line_records.append((left, right, left_rem, right_rem, removed, current))
+
+        # 三变之后，定爻
+        final_lines.append(current // 4)
+        if build_log:
+            records.append(line_records)
+
+    return final_lines, records
+
+
 class DayanDivination:
     """大衍筮法模拟器"""
     
@@ -25,16 +126,25 @@ class DayanDivination:
         self.lines = []  # 存储六爻结果
         self.total_stalks = 50
         self.verbose = verbose
+        # 实例独立的随机数生成器，不依赖 random 模块的全局状态
+        self._rng = random.Random()
 
     def type_print(self, text, speed=0.01):
         """打字机效果，模拟叙述感"""
         if not self.verbose:
             return
-        for char in text:
-            sys.stdout.write(char)
-            sys.stdout.flush()
+        self._type_out(text, speed)
+
+    def _type_out(self, text, speed=0.01):
+        """逐字输出文本（不检查 verbose，供回放动画使用）"""
+        write = sys.stdout.write
+        # 每 _TYPE_FLUSH_EVERY 个字符刷新一次，避免逐字 flush 的系统调用开销
+        for i, char in enumerate(text, 1):
+            write(char)
+            if i % _TYPE_FLUSH_EVERY == 0:
+                sys.stdout.flush()
             time.sleep(speed)
-        print()
+        print(flush=True)
 
     def wait(self, seconds):
         """模拟动作的自然停顿"""
@@ -45,107 +155,63 @@ class DayanDivination:
         """
         【分二】模拟：人手分草，符合高斯分布（正态分布）
         """
-        half = total / 2
-        # 模拟人手误差，大部分时候在中间，偶尔偏多偏少
-        left = int(random.gauss(half, 2.0))
-        
-        # 边界修正：任何一堆至少要有1根
-        if left < 1: left = 1
-        if left >= total: left = total - 1
-        
-        right = total - left
-        return left, right
-
-    def _calculate_physical_count(self, count):
-        """内部计算揲四结果"""
-        remainder = count % 4
-        if remainder == 0:
-            remainder = 4
-        return remainder
+        return _human_split(self._rng.normalvariate, total)
 
     def _display_physical_count(self, pile_name, count):
         """显示揲四过程"""
-        if not self.verbose:
-            return 4 if count % 4 == 0 else count % 4
+        remainder = _remainder(count)
 
-        sys.stdout.write(f"      [{pile_name}手] 揲四计数: ")
+        # 视觉特效：每一个点代表数走了4根，一次性写出后按点数停顿
+        n_dots = (count - 1) // 4 if count > 4 else 0
+        sys.stdout.write(f"      [{pile_name}手] 揲四计数: " + "." * n_dots)
         sys.stdout.flush()
-        
-        current = count
-        # 视觉特效：每减一次显示一个点
-        while current > 4:
-            current -= 4
-            sys.stdout.write(".")  # 每一个点代表数走了4根
-            sys.stdout.flush()
-            time.sleep(0.02)  # 数数的速度
-            
-        remainder = 4 if current == 0 else current
+        time.sleep(0.02 * n_dots)  # 数数的速度
+
         print(f" 剩 {remainder} 策")
         return remainder
 
-    def _calculate_change(self, current_total):
-        """
-        计算【一变】的数据
-        """
-        # 1. 分二
-        left, right = self.human_split(current_total)
-        
-        # 2. 挂一
-        right_hang = right - 1
-        hang_one = 1
-        
-        # 3. 揲四
-        left_rem = self._calculate_physical_count(left)
-        right_rem = self._calculate_physical_count(right_hang)
-        
-        # 5. 归奇
-        removed = hang_one + left_rem + right_rem
-        new_total = current_total - removed
-        
-        return {
-            "left": left,
-            "right": right,
-            "left_rem": left_rem,
-            "right_rem": right_rem,
-            "removed": removed,
-            "new_total": new_total
-        }
-
-    def _calculate_line(self):
-        """计算【一爻】的三变数据"""
-        current_stalks = 49
-        changes = []
-        
-        for _ in range(3):
-            change_data = self._calculate_change(current_stalks)
-            changes.append(change_data)
-            current_stalks = change_data['new_total']
-            
-        # 三变之后，定爻
-        final_num = current_stalks // 4
-        return final_num, changes
-
-    def simulate(self):
+    def simulate(self, build_log=True):
         """
         立即执行完整演算，不显示过程
         
+        Args:
+            build_log: 是否记录演算过程，默认True；
+                       不需要回放时传 False，process_log 为 None
+        
         Returns:
             dict: 包含所有步骤数据的字典，用于后续回放
         """
-        line_data = []
-        final_lines = []
+        final_lines, records = _simulate_kernel(self._rng, build_log)
+        
+        # 结果只通过返回值传递，内部流程不读取 self.lines，同一实例可并发起卦；
+        # self.lines 仅为兼容直接读取该属性的调用方而保留
+        self.lines = final_lines
+        hex_result = self.get_hexagram_result(final_lines)
+        
+        if not build_log:
+            return {
+                "hex_result": hex_result,
+                "process_log": None
+            }
         
-        for i in range(1, 7):
-            val, changes = self._calculate_line()
-            final_lines.append(val)
+        line_data = []
+        for i, (val, line_records) in enumerate(zip(final_lines, records), 1):
+            changes = [
+                {
+                    "left": left,
+                    "right": right,
+                    "left_rem": left_rem,
+                    "right_rem": right_rem,
+                    "removed": removed,
+                    "new_total": new_total
+                }
+                for left, right, left_rem, right_rem, removed, new_total in line_records
+            ]
             line_data.append({
                 "line_idx": i,
                 "value": val,
                 "changes": changes
             })
-            
-        self.lines = final_lines
-        hex_result = self.get_hexagram_result()
         
         return {
             "hex_result": hex_result,
@@ -155,20 +221,19 @@ class DayanDivination:
     def play_process(self, simulation_data):
         """
         根据模拟数据回放这一过程
+        
+        总是播放动画，是否显示由调用方决定；
+        simulation_data 须由 simulate(build_log=True) 生成
         """
-        if not self.verbose:
-            return
-
         print("\n" + "="*60)
         print("          大 衍 筮 法 · 全 过 程 模 拟")
         print("="*60)
-        self.type_print("大衍之数五十，其用四十有九。")
-        self.type_print("分而为二以象两，挂一以象三，")
-        self.type_print("揲之以四以象四时，归奇于扐以象润。")
+        self._type_out("大衍之数五十，其用四十有九。")
+        self._type_out("分而为二以象两，挂一以象三，")
+        self._type_out("揲之以四以象四时，归奇于扐以象润。")
         print("="*60)
-        self.wait(1)
+        time.sleep(1)
 
-        pos_names = ["初", "二", "三", "四", "五", "上"]
         process_log = simulation_data["process_log"]
 
         for line_step in process_log:
@@ -177,7 +242,7 @@ class DayanDivination:
             changes = line_step["changes"]
             
             print("\n" + "#" * 60)
-            print(f"###  正在演算：{pos_names[line_idx-1]}爻  ###")
+            print(f"###  正在演算：{_POS_NAMES[line_idx-1]}爻  ###")
             print("#" * 60)
             
             current_total = 49 # 每次都从49开始描述吗？不对，是每一爻开始都是49
@@ -187,7 +252,7 @@ class DayanDivination:
                 
                 # 回放：分二
                 print(f"      [分二]  左手: {change['left']}  |  右手: {change['right']}  (总: {current_total})")
-                self.wait(0.3)
+                time.sleep(0.3)
                 
                 # 回放：挂一
                 print(f"      [挂一]  取右一策，挂于左手小指")
@@ -202,39 +267,37 @@ class DayanDivination:
                 print(f"      [归奇]  挂1 + 左余{change['left_rem']} + 右余{change['right_rem']} = 去掉 {change['removed']} 策")
                 print(f"      [结余]  当前剩余: {change['new_total']} 策")
                 print("-" * 60)
-                self.wait(0.5)
+                time.sleep(0.5)
                 
                 current_total = change['new_total']
 
             # 显示该爻结果
-            result_text = ""
-            if val == 6: result_text = "老阴 (六) -> 变"
-            elif val == 7: result_text = "少阳 (七) -> 不变"
-            elif val == 8: result_text = "少阴 (八) -> 不变"
-            elif val == 9: result_text = "老阳 (九) -> 变"
-            
-            print(f"  >>> {pos_names[line_idx-1]}爻 结果判定: 剩 {current_total} 策 ÷ 4 = {val}")
-            print(f"  >>> 获得: {result_text}")
-            self.wait(1.5)
+            print(f"  >>> {_POS_NAMES[line_idx-1]}爻 结果判定: 剩 {current_total} 策 ÷ 4 = {val}")
+            print(f"  >>> 获得: {_LINE_RESULT[val]}")
+            time.sleep(1.5)
 
         # 显示最终卦象
-        self.display_hexagram()
+        self.display_hexagram(simulation_data["hex_result"]["original_lines"])
 
     def run(self):
         """
         主程序 - 向后兼容
         """
         # 1. 模拟 calculations
-        data = self.simulate()
+        data = self.simulate(build_log=self.verbose)
         # 2. 播放 visualization
-        self.play_process(data)
+        if self.verbose:
+            self.play_process(data)
         # 3. 返回结果
         return data["hex_result"]
 
-    def get_hexagram_result(self):
+    def get_hexagram_result(self, lines=None):
         """
         获取卦象结果
         
+        Args:
+            lines: 六爻爻值（自初爻起），默认使用 self.lines
+        
         Returns:
             dict: {
                 'original_lines': [6,7,8,9,...],  # 原始爻值
@@ -246,80 +309,69 @@ class DayanDivination:
         """
         # 计算本卦和之卦的二进制表示
         # 特别注意：BINARY_TO_NUMBER 表中是以 654321 (从上往下) 的顺序存储的
-        original_binary = ""
-        changed_binary = ""
+        if lines is None:
+            lines = self.lines
+        n = len(lines)
+        original = bytearray(n)
+        changed = bytearray(n)
         changing_lines = []
         
-        # 1. 记录变爻位置（基于 1-6 顺序）
-        for idx, val in enumerate(self.lines):
+        for idx, val in enumerate(lines):
+            # 二进制字符串必须倒序，从第六爻到第一爻
+            pos = n - 1 - idx
+            
+            # 本卦：7,9为阳(1)，6,8为阴(0)
+            original[pos] = 0x31 if val & 1 else 0x30
+            
+            # 之卦：老阴(6)变阳，老阳(9)变阴；少阳(7)、少阴(8)不变
+            changed[pos] = 0x31 if val == 6 or val == 7 else 0x30
+            
+            # 记录变爻位置（基于 1-6 顺序）
             if val == 6 or val == 9:
                 changing_lines.append(idx + 1)
         
-        # 2. 构建二进制字符串（必须倒序，从第六爻到第一爻）
-        for val in reversed(self.lines):
-            # 本卦：7,9为阳(1)，6,8为阴(0)
-            if val in [7, 9]:
-                original_binary += "1"
-            else:
-                original_binary += "0"
-            
-            # 之卦：老阴(6)变阳，老阳(9)变阴
-            if val == 6:  # 老阴变阳
-                changed_binary += "1"
-            elif val == 9:  # 老阳变阴
-                changed_binary += "0"
-            elif val == 7:  # 少阳不变
-                changed_binary += "1"
-            else:  # val == 8, 少阴不变
-                changed_binary += "0"
+        original_binary = original.decode('ascii')
+        changed_binary = changed.decode('ascii')
         
         return {
-            'original_lines': self.lines.copy(),
+            'original_lines': list(lines),
             'original_binary': original_binary,
             'changed_binary': changed_binary,
             'changing_lines': changing_lines,
             'has_change': len(changing_lines) > 0
         }
 
-    def display_hexagram(self):
+    def display_hexagram(self, lines=None):
         """
         显示最终的本卦与之卦
-        """
-        print("\n\n")
-        print("="*60)
-        print(f"{'【 本 卦 】':^28}")
-        print("="*60)
         
-        pos_names = ["初", "二", "三", "四", "五", "上"]
+        Args:
+            lines: 六爻爻值（自初爻起），默认使用 self.lines
+        """
+        if lines is None:
+            lines = self.lines
+
+        # 先在内存中拼好整块内容，再一次性写出
+        buf = io.StringIO()
+        w = buf.write
+        w("\n\n\n")
+        w("="*60 + "\n")
+        w(f"{'【 本 卦 】':^28}\n")
+        w("="*60 + "\n")
         
-        # 倒序遍历，因为画卦是从上往下画
+        # 倒序遍历，因为画卦是从上往下画（仅显示本卦）
         for i in range(5, -1, -1):
-            num = self.lines[i]
-            p_name = pos_names[i]
-            
-            # 定义符号（短横，便于紧凑显示）
-            yin = "— —"
-            yang = "———"
-            
-            # 构建本卦的图形（仅显示本卦，去掉之卦）
-            if num == 6:  # 老阴 -> 变阳（显示为老阴的本卦形态）
-                left = f"{yin} x"
-                name = "老阴"
-            elif num == 7:  # 少阳 -> 不变
-                left = f"{yang}  "
-                name = "少阳"
-            elif num == 8:  # 少阴 -> 不变
-                left = f"{yin}  "
-                name = "少阴"
-            elif num == 9:  # 老阳 -> 变阴
-                left = f"{yang} o"
-                name = "老阳"
+            num = lines[i]
+            p_name = _POS_NAMES[i]
+            left, name = _LINE_GLYPH[num]
                 
             # 格式化输出（仅本卦），对齐本卦图像并缩短横杠
             label = f"{p_name}{'九' if num%2!=0 else '六'}:"
-            print(f"{label:<4} {left:<9} ({name})")
+            w(f"{label:<4} {left:<9} ({name})\n")
             
-        print("="*60)
+        w("="*60 + "\n")
+        sys.stdout.write(buf.getvalue())
+        sys.stdout.flush()
         self.analyze_summary()
         
     def analyze_summary(self):
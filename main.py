@@ -8,6 +8,8 @@ I-Ching Divination Main Program
 
 import sys
 import re
+import threading
+import queue
 from pathlib import Path
 
 # 导入自定义模块
@@ -17,6 +19,67 @@ from ollama_client import OllamaClient
 from prompt_templates import PromptTemplates
 
 
+# Markdown清理用的正则：所有格式合并为一个交替模式，单次扫描完成清理
+# 行内格式（加粗斜体、加粗、斜体、代码块、行内代码），按优先级排列
+_MD_INLINE = (
+    r'(?P<bold3>\*\*\*([^*]+)\*\*\*)'
+    r'|(?P<bold1>\*\*([^*]+)\*\*)'
+    r'|(?P<bold2>__([^_]+)__)'
+    r'|(?P<ital1>\*([^*]+)\*)'
+    r'|(?P<ital2>_([^_]+)_)'
+    r'|(?P<cb>```[^`]*```)'
+    r'|(?P<ci>`([^`]+)`)'
+)
+_RE_MD = re.compile(_MD_INLINE + r'|(?P<h>^#{1,6}\s+)', re.MULTILINE)
+
+# 清理格式内部文本用的模式：不含标题，避免把行中间的 # 当作行首标题去掉
+_RE_MD_INNER = re.compile(_MD_INLINE)
+
+# 文本开头的标题标记
+_RE_HEADING_START = re.compile(r'^#{1,6}\s+')
+
+# 可能构成Markdown格式的符号
+_MD_CHARS = '*_#`'
+
+# 各格式对应的内部文本分组序号（标题、代码块整体去除，不在表中）；
+# 两个模式的行内部分相同，分组序号一致
+_MD_INNER_GROUP = {
+    name: _RE_MD_INNER.groupindex[name] + 1
+    for name in ('bold3', 'bold1', 'bold2', 'ital1', 'ital2', 'ci')
+}
+
+
+def _has_md_chars(text):
+    """文本中是否含有可能构成Markdown格式的符号"""
+    for char in _MD_CHARS:
+        if char in text:
+            return True
+    return False
+
+
+def _md_sub(m):
+    """_RE_MD_INNER 的替换回调：保留格式包裹的文本，去除其余标记"""
+    group = _MD_INNER_GROUP.get(m.lastgroup)
+    if group is None:
+        return ''
+    # 内部文本可能还嵌套其他格式（如 **_text_**），递归清理
+    return _RE_MD_INNER.sub(_md_sub, m.group(group))
+
+
+def _md_sub_top(m):
+    """_RE_MD 的替换回调：在 _md_sub 基础上处理行首强调内露出的标题标记"""
+    cleaned = _md_sub(m)
+    # 原先先去强调、再去标题、最后去代码：行首强调去掉后露出的 # 仍算标题，
+    # 行内代码里的 # 则保留
+    if m.lastgroup not in ('ci', 'cb', 'h'):
+        start = m.start()
+        at_line_start = start == 0 or m.string[start - 1] == '\n'
+        inner = m.group(_MD_INNER_GROUP[m.lastgroup])
+        if at_line_start and inner.lstrip('*_').startswith('#'):
+            cleaned = _RE_HEADING_START.sub('', cleaned)
+    return cleaned
+
+
 def clean_markdown(text):
     """
     清除文本中的Markdown格式符号
@@ -27,21 +90,19 @@ def clean_markdown(text):
     Returns:
         str: 清除格式后的文本
     """
-    # 去除加粗 **text** 或 __text__
-    text = re.sub(r'\*\*([^*]+)\*\*', r'\1', text)
-    text = re.sub(r'__([^_]+)__', r'\1', text)
+    # 快速路径：流式片段大多是纯文本，不含任何Markdown符号时直接返回
+    if not _has_md_chars(text):
+        return text
     
-    # 去除斜体 *text* 或 _text_
-    text = re.sub(r'\*([^*]+)\*', r'\1', text)
-    text = re.sub(r'_([^_]+)_', r'\1', text)
-    
-    # 去除标题标记 # ## ###
-    text = re.sub(r'^#{1,6}\s+', '', text, flags=re.MULTILINE)
-    
-    # 去除代码块标记 ``` 或 `
-    text = re.sub(r'```[^`]*```', '', text)
-    text = re.sub(r'`([^`]+)`', r'\1', text)
+    text = _RE_MD.sub(_md_sub_top, text)
     
+    # 去掉一层格式后可能露出新的格式（如 _a*b_c* 中的 *b_c*），
+    # 有改动且仍含符号时再扫一遍；标题只认原文的行首，后续遍不再处理
+    while _has_md_chars(text):
+        cleaned = _RE_MD_INNER.sub(_md_sub, text)
+        if cleaned == text:
+            break
+        text = cleaned
     return text
 
 
@@ -69,28 +130,32 @@ class IChing:
         self.verbose = verbose
         self.concise = concise
     
-    def divine(self, question="", stream=False):
+    def divine(self, question="", stream=False, verbose=None, assume_connected=False):
         """
         执行完整的占卜流程 (异步优化版)
         
         Args:
             question: 占卜问题
             stream: 是否流式输出AI响应
+            verbose: 本次是否显示详细过程，None 表示沿用实例设置
+            assume_connected: 调用方已检查过Ollama连接时传 True，跳过重复检查
             
         Returns:
             str: AI解卦结果 (非流式)
-            Generator: 生成器 (流式)
+            Generator: 生成器 (流式，非verbose)
+            None: 流式且verbose时直接打印到终端
         """
-        import threading
-        import queue
-
-        # 1. 检查Ollama连接
-        if not self.ollama.check_connection():
+        # 单次调用的显示设置，不修改实例状态，便于并发调用
+        if verbose is None:
+            verbose = self.verbose
+        
+        # 1. 检查Ollama连接（调用方已检查过则跳过）
+        if not assume_connected and not self.ollama.check_connection():
             return "错误: 无法连接到Ollama服务，请确保Ollama正在运行。"
         
         # 2. 立即计算卦象结果 (不含显示)
-        #    利用 refactor 后的 simulate 方法瞬间得到结果
-        simulation_data = self.divination.simulate()
+        #    利用 refactor 后的 simulate 方法瞬间得到结果，仅在需要回放动画时记录过程
+        simulation_data = self.divination.simulate(build_log=verbose)
         divination_result = simulation_data["hex_result"]
 
         # 3. 解析卦象
@@ -103,11 +168,17 @@ class IChing:
         if original_hex is None:
             return f"错误: 无法找到卦象数据。二进制: {divination_result['original_binary']}"
         
-        hexagram_info = f"本卦: {original_hex.get('name_cn', '未知')}卦 (第{original_hex.get('number', '?')}卦)"
+        changing_lines = interpretation['changing_lines']
+        name = original_hex.get('name_cn', '未知')
+        num = original_hex.get('number', '?')
+        info_parts = [f"本卦: {name}卦 (第{num}卦)"]
         if changed_hex:
-            hexagram_info += f"\n之卦: {changed_hex.get('name_cn', '未知')}卦 (第{changed_hex.get('number', '?')}卦)"
-        if interpretation['changing_lines']:
-            hexagram_info += f"\n变爻: 第{interpretation['changing_lines']}爻"
+            name = changed_hex.get('name_cn', '未知')
+            num = changed_hex.get('number', '?')
+            info_parts.append(f"之卦: {name}卦 (第{num}卦)")
+        if changing_lines:
+            info_parts.append(f"变爻: 第{changing_lines}爻")
+        hexagram_info = "\n".join(info_parts)
         
         user_prompt, system_prompt = PromptTemplates.build_divination_prompt(
             question=question,
@@ -119,29 +190,33 @@ class IChing:
         )
 
         # 5. 启动后台线程请求 AI
-        #    使用 Queue 来传递 AI 的响应结果
+        #    使用 Queue 来传递 AI 的响应结果，每条消息为 (tag, data)：
+        #    'chunk' 流式片段 / 'done' 结束（非流式时携带完整文本）/ 'error' 异常
         ai_response_queue = queue.Queue()
         
         def ai_worker():
             try:
-                # 获取完整响应（即使前端要求流式，我们也先在后台获取生成器或完整文本）
-                # 这里为了配合前端流式体验，如果是 stream=True，我们将生成器放入 queue
-                # 如果是 stream=False，我们将完整字符串放入 queue
                 res = self.ollama.generate(
                     prompt=user_prompt,
                     system_prompt=system_prompt,
                     temperature=0.7,
                     stream=stream
                 )
-                ai_response_queue.put(res)
+                if stream:
+                    # 流式：在后台线程中读取网络数据，与前台动画真正并行
+                    for chunk in res:
+                        ai_response_queue.put(('chunk', chunk))
+                    ai_response_queue.put(('done', None))
+                else:
+                    ai_response_queue.put(('done', res))
             except Exception as e:
-                ai_response_queue.put(e)
+                ai_response_queue.put(('error', e))
 
         ai_thread = threading.Thread(target=ai_worker)
         ai_thread.start()
 
         # 6. 当 AI 在后台思考时，前台播放大衍筮法动画
-        if self.verbose:
+        if verbose:
             print("\n" + "="*60)
             print("开始起卦...")
             print("="*60)
@@ -153,35 +228,48 @@ class IChing:
             print("正在请AI大师解卦...")
             print("="*60 + "\n")
 
-        # 7. 等待 AI 线程完成 (通常动画播放完，AI也差不多好了)
-        ai_thread.join()
-        
-        # 获取结果
-        response = ai_response_queue.get()
-        
-        if isinstance(response, Exception):
-            return f"错误: AI生成失败 - {str(response)}"
+        # 7. 处理并返回输出
+        if stream and verbose:
+            # 命令行流式输出：直接打印片段，不经过生成器，返回 None
+            while True:
+                tag, data = ai_response_queue.get()
+                if tag == 'done':
+                    break
+                if tag == 'error':
+                    # 另起一行，避免紧跟在已输出的部分回答之后
+                    print(f"\n错误: AI生成失败 - {str(data)}", end='', flush=True)
+                    break
+                print(clean_markdown(data), end='', flush=True)
+            ai_thread.join()
+            print("\n")
+            return None
 
-        # 8. 处理并返回输出
         if stream:
-            # 流式输出
+            # 程序调用的流式输出：边从队列取片段边产出，不等待 AI 线程结束
             def stream_wrapper():
-                # response 是一个 generator
-                for chunk in response:
-                    cleaned_chunk = clean_markdown(chunk)
-                    if self.verbose:
-                        print(cleaned_chunk, end='', flush=True)
-                    yield cleaned_chunk
-                if self.verbose:
-                    print("\n")
+                while True:
+                    tag, data = ai_response_queue.get()
+                    if tag == 'done':
+                        break
+                    if tag == 'error':
+                        yield f"错误: AI生成失败 - {str(data)}"
+                        break
+                    yield clean_markdown(data)
+                ai_thread.join()
             return stream_wrapper()
-        else:
-            # 一次性输出
-            cleaned_response = clean_markdown(response)
-            if self.verbose:
-                print(cleaned_response)
-                print("\n" + "="*60)
-            return cleaned_response
+
+        # 一次性输出：等待 AI 线程完成 (通常动画播放完，AI也差不多好了)
+        tag, response = ai_response_queue.get()
+        ai_thread.join()
+        
+        if tag == 'error':
+            return f"错误: AI生成失败 - {str(response)}"
+
+        cleaned_response = clean_markdown(response)
+        if verbose:
+            print(cleaned_response)
+            print("\n" + "="*60)
+        return cleaned_response
     
     def quick_divine(self, question=""):
         """
@@ -193,16 +281,7 @@ class IChing:
         Returns:
             str: AI解卦结果
         """
-        original_verbose = self.verbose
-        self.divination.verbose = False
-        self.verbose = False
-        
-        result = self.divine(question=question, stream=False)
-        
-        self.divination.verbose = original_verbose
-        self.verbose = original_verbose
-        
-        return result
+        return self.divine(question=question, stream=False, verbose=False)
 
 
 def main():
@@ -241,12 +320,10 @@ def main():
     print("开始占卜...")
     print("="*60)
     
-    # 使用流式输出
-    result_generator = iching.divine(question=question, stream=True)
-    
-    # 消费生成器
-    for _ in result_generator:
-        pass
+    # 使用流式输出（verbose 模式下直接打印，成功时返回 None）
+    result = iching.divine(question=question, stream=True, assume_connected=True)
+    if result is not None:
+        print(result)
     
     print("\n" + "="*60)
     print("占卜完成")
@@ -6,6 +6,8 @@ Prompt Templates
 包含用于周易占卜的prompt模板
 """
 
+import re
+
 
 class PromptTemplates:
     """Prompt模板集合"""
@@ -39,6 +41,13 @@ class PromptTemplates:
 请写成一段完整、连贯的话，不要分段，不要使用数字序号。内容必须包含：导致上述结论的具体原因分析，并直接引用周易原文中的关键句子作为佐证。请将原文引用自然地融入到你的分析中（例如：“依据卦辞中‘xxx’的描述，说明了……”），让原因和依据浑然一体。
 """
     
+    # 精简模板预先按占位符切分为四段文本，构建 prompt 时只做字符串拼接，
+    # 无需每次解析 str.format 的格式语法
+    _TEMPLATE_PARTS = tuple(
+        re.split(r'\{question\}|\{hexagram_info\}|\{hexagram_texts\}',
+                 DIVINATION_TEMPLATE_CONCISE)
+    )
+    
     @staticmethod
     def build_divination_prompt(question, hexagram_info, interpretation_guide, 
                                original_text, changed_text="", concise=False):
@@ -62,16 +71,15 @@ class PromptTemplates:
             hexagram_texts += f"\n\n{'='*50}\n【之卦】\n{changed_text}"
         
         # 强制使用精简模板和系统提示词
-        template = PromptTemplates.DIVINATION_TEMPLATE_CONCISE
-        system_prompt = PromptTemplates.SYSTEM_PROMPT_CONCISE
-        
-        prompt = template.format(
-            question=question if question else "无具体问题，请通占",
-            hexagram_info=hexagram_info,
-            hexagram_texts=hexagram_texts
+        head, after_question, after_info, tail = PromptTemplates._TEMPLATE_PARTS
+        prompt = (
+            head + (question if question else "无具体问题，请通占")
+            + after_question + hexagram_info
+            + after_info + hexagram_texts
+            + tail
         )
         
-        return prompt, system_prompt
+        return prompt, PromptTemplates.SYSTEM_PROMPT_CONCISE
 
 
 if __name__ == "__main__":
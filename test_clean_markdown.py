@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+clean_markdown 等价性检查
+Equivalence check for clean_markdown
+
+将单遍合并正则的 clean_markdown 与原先逐类依次 re.sub 的实现逐条对比
+"""
+
+import re
+
+from main import clean_markdown
+
+
+def reference_clean_markdown(text):
+    """原先的实现：七类格式依次用 re.sub 清理"""
+    text = re.sub(r'\*\*([^*]+)\*\*', r'\1', text)
+    text = re.sub(r'__([^_]+)__', r'\1', text)
+    text = re.sub(r'\*([^*]+)\*', r'\1', text)
+    text = re.sub(r'_([^_]+)_', r'\1', text)
+    text = re.sub(r'^#{1,6}\s+', '', text, flags=re.MULTILINE)
+    text = re.sub(r'```[^`]*```', '', text)
+    text = re.sub(r'`([^`]+)`', r'\1', text)
+    return text
+
+
+CASES = [
+    # 纯文本（快速路径）
+    "",
+    "乾卦，元亨利贞。",
+    # 单一格式
+    "**能成**",
+    "__能成__",
+    "*能成*",
+    "_能成_",
+    "`乾`",
+    "```python\nprint(1)\n```结论",
+    "# 结论",
+    "## 一、结论\n### 二、原因",
+    # 嵌套与加粗斜体
+    "***x***",
+    "**_x_**",
+    "_**x**_",
+    "*__x__*",
+    "`**x**`",
+    "***__吉__***",
+    # 格式交错
+    "_a*b_c*",
+    "*# y*",
+    "x *# y*",
+    "a_b_c",
+    # 行内代码或强调中的 # 不是标题
+    "`# 注释` 说明",
+    "**`# x`**",
+    "**_# y_**",
+    "# #\n",
+    # 综合
+    "# T\n**a** __b__ *c* _d_ `e` ```x``` z",
+    "## 结论\n**能成**，依据`乾`卦\n- 初九：*潜龙勿用*",
+]
+
+
+def test_clean_markdown_matches_reference():
+    for text in CASES:
+        assert clean_markdown(text) == reference_clean_markdown(text), repr(text)
+
+
+if __name__ == "__main__":
+    test_clean_markdown_matches_reference()
+    print(f"✓ {len(CASES)} 个用例与原实现一致")